@@ -1,11 +1,20 @@
 import io
+import mmap
 import os
+import struct
+import sys
 import zlib
-from typing import BinaryIO, Optional, Union
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from typing import BinaryIO, Callable, List, Optional, TextIO, Tuple, Union
 
 MAGIC = b'BPS1'
 _BUFFER_SIZE = 8192
-_EMPTY_DATA = bytes(_BUFFER_SIZE)
+_FOOTER = struct.Struct('<III') # Source, target, and patch checksums
+_WINDOW_SIZE = 1 << 16
+_PROGRESS_MASK = 0xffff # Progress is printed every 65536 commands when verbose
+_CRC_BATCH_SIZE = 1 << 20
+_PARALLEL_CRC_CHUNK = 1 << 22 # Smallest slice worth handing to another thread
 
 
 class BPSError(ValueError):
@@ -20,40 +29,402 @@ class ChecksumFailure(BPSError):
     pass
 
 
+# Ported from zlib's crc32.c (multmodp/x2nmodp), for when there's no faster crc32_combine around
+_CRC32_POLY = 0xedb88320
+
+
+def _multmodp(a: int, b: int) -> int:
+    """Multiplies a and b modulo the CRC polynomial"""
+    m = 1 << 31
+    p = 0
+    while True:
+        if a & m:
+            p ^= b
+            if (a & (m - 1)) == 0:
+                break
+        m >>= 1
+        b = (b >> 1) ^ _CRC32_POLY if b & 1 else b >> 1
+    return p
+
+
+_X2N_TABLE = [1 << 30] # x^2^n modulo the CRC polynomial
+for _ in range(31):
+    _X2N_TABLE.append(_multmodp(_X2N_TABLE[-1], _X2N_TABLE[-1]))
+
+
+def _x2nmodp(n: int, k: int) -> int:
+    """Returns x^(n * 2^k) modulo the CRC polynomial"""
+    p = 1 << 31
+    while n:
+        if n & 1:
+            p = _multmodp(_X2N_TABLE[k & 31], p)
+        n >>= 1
+        k += 1
+    return p
+
+
+def _py_crc32_combine(crc1: int, crc2: int, len2: int) -> int:
+    """Returns the CRC of A + B given crc1 = CRC(A), crc2 = CRC(B), and len2 = len(B)"""
+    return _multmodp(_x2nmodp(len2, 3), crc1) ^ crc2
+
+
+def _libz_crc32_combine() -> Optional[Callable[[int, int, int], int]]:
+    """Binds crc32_combine64 from the system zlib, or returns None if it can't be found"""
+    try:
+        import ctypes
+        import ctypes.util
+    except ImportError:
+        return None
+    name = ctypes.util.find_library('z')
+    if name is None:
+        return None
+    try:
+        combine = ctypes.CDLL(name).crc32_combine64
+    except (OSError, AttributeError):
+        return None
+    combine.argtypes = [ctypes.c_ulong, ctypes.c_ulong, ctypes.c_int64]
+    combine.restype = ctypes.c_ulong
+
+    def crc32_combine(crc1: int, crc2: int, len2: int) -> int:
+        return combine(crc1, crc2, len2) & 0xffffffff # uLong may be wider than 32 bits
+
+    return crc32_combine
+
+
+def _bind_crc32_combine(crc1: int, crc2: int, len2: int) -> int:
+    """Picks a crc32_combine on first use, so importing doesn't have to go looking for libz"""
+    global _crc32_combine
+    _crc32_combine = _libz_crc32_combine() or _py_crc32_combine
+    return _crc32_combine(crc1, crc2, len2)
+
+
+# zlib.crc32_combine is Python 3.14+
+_crc32_combine: Callable[[int, int, int], int] = getattr(zlib, 'crc32_combine', None) or _bind_crc32_combine
+
+
+def _map_file(fileobj: BinaryIO, prefetch: bool = False) -> Optional[mmap.mmap]:
+    """Maps fileobj read-only, or returns None if it can't be mapped (not a real file, or empty)"""
+    try:
+        mapped = mmap.mmap(fileobj.fileno(), 0, access=mmap.ACCESS_READ)
+    except (AttributeError, io.UnsupportedOperation, ValueError, OSError):
+        return None
+    if prefetch and hasattr(mmap, 'MADV_WILLNEED'):
+        # Have the kernel read the file in the background, overlapping the I/O with patching
+        mapped.madvise(mmap.MADV_WILLNEED)
+    return mapped
+
+
+def _crc32_zeros(crc: int, n: int) -> int:
+    """Returns zlib.crc32(bytes(n), crc) without touching n bytes of zeros"""
+    # The CRC is pre- and post-inverted, so CRC(zeros) itself isn't 0
+    return _crc32_combine(crc ^ 0xffffffff, 0, n) ^ 0xffffffff
+
+
+def _parallel_crc32(fileobj: BinaryIO, offset: int, length: int, nthreads: Optional[int] = None) -> int:
+    """Returns the CRC of length bytes of fileobj starting at offset"""
+    if length <= 0:
+        return 0
+    mapped = _map_file(fileobj)
+    if mapped is None:
+        fileobj.seek(offset, io.SEEK_SET)
+        checksum = 0
+        while length > 0:
+            data = fileobj.read(min(length, _CRC_BATCH_SIZE))
+            if not data:
+                break
+            checksum = zlib.crc32(data, checksum)
+            length -= len(data)
+        return checksum
+    if nthreads is None:
+        nthreads = os.cpu_count() or 1
+    nthreads = max(1, min(nthreads, length // _PARALLEL_CRC_CHUNK))
+    chunk_size = -(-length // nthreads)
+    chunks = [(start, min(chunk_size, offset + length - start)) for start in range(offset, offset + length, chunk_size)]
+    with mapped, memoryview(mapped) as view:
+        if len(chunks) == 1:
+            return zlib.crc32(view[offset:offset + length])
+        with ThreadPoolExecutor(nthreads) as executor:
+            # zlib releases the GIL for large buffers, so these really do run in parallel
+            checksums = list(executor.map(lambda chunk: zlib.crc32(view[chunk[0]:chunk[0] + chunk[1]]), chunks))
+    checksum = checksums[0]
+    for (_, size), chunk_checksum in zip(chunks[1:], checksums[1:]):
+        checksum = _crc32_combine(checksum, chunk_checksum, size)
+    return checksum
+
+
+class _CrcSink:
+    """Checksums a buffer that's filled (or read) front to back, in as few zlib.crc32 calls as possible"""
+    buffer: Union[memoryview, bytearray]
+    checksum: int
+    end: int
+
+    def __init__(self, buffer: Union[memoryview, bytearray]) -> None:
+        self.buffer = buffer
+        self.checksum = 0
+        self.end = 0 # Everything in buffer before this has been checksummed
+
+    def catch_up(self, end: int) -> None:
+        """Folds everything in buffer up to end into checksum"""
+        if self.end < end:
+            with memoryview(self.buffer) as view:
+                self.checksum = zlib.crc32(view[self.end:end], self.checksum)
+            self.end = end
+
+    def combine(self, checksum: int, length: int) -> None:
+        """Extends the checksum past end with length bytes whose own checksum is already known"""
+        self.checksum = _crc32_combine(self.checksum, checksum, length)
+        self.end += length
+
+    def zeros(self, length: int) -> None:
+        """Extends the checksum past end with length zeros"""
+        self.checksum = _crc32_zeros(self.checksum, length)
+        self.end += length
+
+
+class _NoCrcSink(_CrcSink):
+    """Stands in for a _CrcSink when nobody is going to look at the checksum"""
+
+    def catch_up(self, end: int) -> None:
+        pass
+
+    def combine(self, checksum: int, length: int) -> None:
+        pass
+
+    def zeros(self, length: int) -> None:
+        pass
+
+
 class _ReadState:
     buffer: BinaryIO
     position: int
     checksum: int
+    _pending: bytearray
 
     def __init__(self, buffer: BinaryIO) -> None:
         self.buffer = buffer
         self.position = 0
         self.checksum = 0
+        self._pending = bytearray()
 
     def read(self, n: int = 1) -> bytes:
         data = self.buffer.read(n)
         self.position += len(data) # May be smaller than n
-        self.checksum = zlib.crc32(data, self.checksum) & 0xffffffff
+        self._pending += data
+        if len(self._pending) >= _CRC_BATCH_SIZE:
+            self.flush()
         return data
 
-    def write(self, data: bytes) -> None:
-        self.buffer.write(data)
-        self.position += len(data)
-        self.checksum = zlib.crc32(data, self.checksum) & 0xffffffff
+    def flush(self) -> None:
+        """Folds any data not yet checksummed into checksum"""
+        if self._pending:
+            self.checksum = zlib.crc32(self._pending, self.checksum)
+            self._pending.clear()
 
+    def combine(self, checksum: int, length: int) -> None:
+        """Skips past length bytes whose checksum was computed some other way"""
+        self.flush()
+        self.checksum = _crc32_combine(self.checksum, checksum, length)
+        self.position += length
 
-class _PatchState:
-    source: _ReadState
-    patch: _ReadState
-    target: _ReadState
 
-    def __init__(self, source: BinaryIO, patch: BinaryIO, target: BinaryIO) -> None:
-        self.source = _ReadState(source)
-        self.patch = _ReadState(patch)
-        self.target = _ReadState(target)
+class _NoCrcReadState(_ReadState):
+    """A _ReadState that doesn't checksum anything, for when checksums are being skipped"""
 
+    def __init__(self, buffer: BinaryIO) -> None:
+        # No _pending buffer, since nothing is ever batched up for crc32
+        self.buffer = buffer
+        self.position = 0
+        self.checksum = 0
+
+    def read(self, n: int = 1) -> bytes:
+        data = self.buffer.read(n)
+        self.position += len(data) # May be smaller than n
+        return data
 
-_Readable = Union[_ReadState, BinaryIO]
+    def flush(self) -> None:
+        pass
+
+    def combine(self, checksum: int, length: int) -> None:
+        self.position += length
+
+
+class _MmapReader:
+    """Reads a memory mapped file, handing out views of it instead of copies"""
+    view: memoryview
+    position: int
+    sink: _CrcSink
+
+    def __init__(self, mapped: mmap.mmap, checksum: bool = True, offset: int = 0) -> None:
+        self.view = memoryview(mapped)[offset:] # Positions (and the checksum) start at offset in the file
+        self.position = 0
+        self.sink = _CrcSink(self.view) if checksum else _NoCrcSink(self.view)
+
+    @property
+    def checksum(self) -> int:
+        return self.sink.checksum
+
+    def read(self, n: int = 1) -> memoryview:
+        data = self.view[self.position:self.position + n]
+        self.position += len(data) # May be smaller than n
+        return data
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self.position
+        elif whence == io.SEEK_END:
+            offset += len(self.view)
+        if offset < 0:
+            raise ValueError(f'negative seek position {offset}')
+        self.position = offset
+        return offset
+
+    def flush(self) -> None:
+        """Folds everything read so far into checksum (reads must not have been seeked)"""
+        self.sink.catch_up(self.position)
+
+    def combine(self, checksum: int, length: int) -> None:
+        """Skips past length bytes whose checksum was computed some other way"""
+        self.flush()
+        self.sink.combine(checksum, length)
+        self.position += length
+
+
+class _MemTarget:
+    """Builds the target in memory, so TargetCopy never has to read it back from disk"""
+    buffer: BinaryIO
+    position: int
+    sink: _CrcSink
+    _mem: bytearray
+    _flushed: int
+
+    def __init__(self, buffer: BinaryIO, checksum: bool = True) -> None:
+        self.buffer = buffer
+        self.position = 0
+        self._mem = bytearray()
+        self.sink = _CrcSink(self._mem) if checksum else _NoCrcSink(self._mem)
+        self._flushed = 0
+
+    @property
+    def checksum(self) -> int:
+        return self.sink.checksum
+
+    def reserve(self, size: int) -> None:
+        """Preallocates the target, so writes become slice assignments instead of appends"""
+        if size > len(self._mem):
+            self._mem += bytes(size - len(self._mem))
+
+    def write(self, data: Union[bytes, memoryview]) -> None:
+        end = self.position + len(data)
+        self._mem[self.position:end] = data # Grows the target if it's bigger than reserved
+        self.position = end
+
+    def copy(self, offset: int, length: int) -> None:
+        """Appends length bytes of the target starting at offset (which may overlap the end)"""
+        mem = self._mem
+        position = self.position
+        if not 0 <= offset < position:
+            raise InvalidFormatError(f'TargetCopy offset {offset} is outside of the target (size {position})')
+        end = position + length
+        self.reserve(end)
+        distance = position - offset
+        if length <= distance:
+            mem[position:end] = mem[offset:offset + length]
+        elif distance == 1:
+            # A run of the same byte (the classic RLE case)
+            mem[position:end] = bytes((mem[offset],)) * length
+        else:
+            # The copy overlaps itself, so it's the last distance bytes repeated over and over
+            mem[position:end] = (mem[offset:position] * (length // distance + 1))[:length]
+        self.position = end
+
+    def flush(self) -> None:
+        """Writes the unwritten part of the target and folds whatever's left into checksum"""
+        if self._flushed < self.position:
+            with memoryview(self._mem) as view:
+                data = view[self._flushed:self.position]
+                self.buffer.write(data)
+                data.release()
+            self._flushed = self.position
+        self.sink.catch_up(self.position)
+
+    def _allocate(self, length: int) -> bool:
+        """Has the filesystem extend the file with length (sparse) zeros, returning False if it can't"""
+        try:
+            fileno = self.buffer.fileno()
+            self.buffer.flush()
+            start = self.buffer.tell()
+            os.ftruncate(fileno, start + length)
+        except (AttributeError, io.UnsupportedOperation, OSError):
+            return False
+        self.buffer.seek(length, io.SEEK_CUR)
+        return True
+
+    def pad(self, size: int) -> None:
+        """Zero pads the flushed target up to size, without writing out or checksumming every zero"""
+        if self.position < size:
+            padding = size - self.position
+            if not self._allocate(padding):
+                # Writing past a gap leaves a (sparse, where supported) run of zeros
+                self.buffer.seek(padding - 1, io.SEEK_CUR)
+                self.buffer.write(b'\0')
+            self.sink.zeros(padding)
+            self.position = self._flushed = size
+
+
+class _PatchState:
+    source: Union[_ReadState, _MmapReader]
+    patch: Union[_ReadState, _MmapReader]
+    target: _MemTarget
+
+    def __init__(self, source: BinaryIO, patch: BinaryIO, target: BinaryIO, skip_checksum: bool = False) -> None:
+        checksum = not skip_checksum
+        read_state = _NoCrcReadState if skip_checksum else _ReadState
+        mapped = _map_file(source, prefetch=True)
+        self.source = read_state(source) if mapped is None else _MmapReader(mapped, checksum)
+        mapped = _map_file(patch, prefetch=True)
+        # The patch may be embedded in a bigger file, so it starts wherever patch is now
+        self.patch = read_state(patch) if mapped is None else _MmapReader(mapped, checksum, patch.tell())
+        self.target = _MemTarget(target, checksum)
+
+
+class _RingReader:
+    """Reads ahead from a _ReadState so small reads (like varints) don't each go through it"""
+    source: Union[_ReadState, _MmapReader]
+    buffer: Union[bytes, memoryview]
+    index: int
+    limit: int
+
+    def __init__(self, source: Union[_ReadState, _MmapReader], limit: int) -> None:
+        self.source = source
+        self.buffer = b''
+        self.index = 0
+        self.limit = limit # Never read past this position in source
+        if isinstance(source, _MmapReader):
+            # Everything is already in memory, so the window can just be all of it
+            self.buffer = source.read(limit - source.position)
+
+    @property
+    def position(self) -> int:
+        return self.source.position - len(self.buffer) + self.index
+
+    def refill(self, n: int = 1) -> None:
+        """Moves the window forward so that (if possible) at least n bytes are available"""
+        unread = self.buffer[self.index:]
+        wanted = min(max(n - len(unread), _WINDOW_SIZE), self.limit - self.source.position)
+        if wanted <= 0:
+            return # Nothing left to read, so leave the window where it is
+        self.buffer = bytes(unread) + self.source.read(wanted)
+        self.index = 0
+
+    def read(self, n: int = 1) -> Union[bytes, memoryview]:
+        if self.index + n > len(self.buffer):
+            self.refill(n)
+        data = self.buffer[self.index:self.index + n]
+        self.index += len(data)
+        return data
+
+
+_Readable = Union[_ReadState, _MmapReader, BinaryIO]
 
 
 class PatchResult:
@@ -65,67 +436,101 @@ class PatchResult:
     patch_checksum: int
 
 
-def _decode_number(input: _Readable) -> int:
-    data = 0
-    shift = 1
+def _decode_varint(buffer: Union[bytes, memoryview], index: int) -> Tuple[int, int]:
+    """Decodes the number at index in buffer, returning it and the index just past it"""
+    x = buffer[index]
+    if x & 0x80:
+        return x & 0x7f, index + 1 # Most numbers fit in one byte
+    data = x + 0x80
+    shift = 0x80
+    index += 1
     while True:
-        x = input.read(1)[0]
+        x = buffer[index]
+        index += 1
         data += (x & 0x7f) * shift
         if x & 0x80:
-            break
+            return data, index
         shift <<= 7
         data += shift
+
+
+def _decode_number(reader: _RingReader) -> int:
+    try:
+        data, reader.index = _decode_varint(reader.buffer, reader.index)
+    except IndexError:
+        # Ran off the end of the window, so move it along and try again
+        reader.refill()
+        try:
+            data, reader.index = _decode_varint(reader.buffer, reader.index)
+        except IndexError:
+            raise InvalidFormatError('Unexpected end of patch') from None
     return data
 
 
-def _buffered_copy(source: _Readable, target: _Readable, length: int, buffer_size: int = _BUFFER_SIZE) -> None:
+def _buffered_copy(source: _Readable, target: _MemTarget, length: int, buffer_size: int = _BUFFER_SIZE) -> None:
     while length > 0:
         buffer = source.read(min(length, buffer_size))
+        if not buffer:
+            break # Hit EOF, so there's nothing left to copy
         target.write(buffer)
-        length -= buffer_size
+        length -= len(buffer)
+
+
+def _view_copy(source: _MmapReader, target: _MemTarget, length: int) -> None:
+    """Copies from a mapped source in one go, since reading it just hands out a view"""
+    target.write(source.read(length))
 
 
 def dis(
         patch: BinaryIO,
-        patch_size: int
+        patch_size: int,
+        file: Optional[TextIO] = None
     ) -> None:
-    reader = _ReadState(patch)
-
-    print('string         ', reader.read(4))
-    source_size = _decode_number(reader)
-    print('source-size    ', source_size)
-    target_size = _decode_number(reader)
-    print('target-size    ', target_size)
-    metadata_size = _decode_number(reader)
-    print('metadata-size  ', metadata_size)
-    metadata = reader.read(metadata_size)
-    print('metadata       ', metadata)
-
-    patch_end = patch_size - 12
-    print('repeat')
-    while reader.position < patch_end:
-        data = _decode_number(reader)
-        command = data & 3
-        length = (data >> 2) + 1
-        if command == 0:
-            print('   SourceRead', length)
-        elif command == 1:
-            print('   TargetRead', length, reader.read(length))
-        elif command == 2:
-            data = _decode_number(reader)
-            print('   SourceCopy', length, (-1 if (data & 1) else 1) * (data >> 1))
-        elif command == 3:
-            data = _decode_number(reader)
-            print('   TargetCopy', length, (-1 if (data & 1) else 1) * (data >> 1))
-        else:
-            raise InvalidFormatError(f'Invalid command {command} (expected 0, 1, 2, or 3)')
-
-    source_checksum = int.from_bytes(reader.read(4), 'little', signed=False)
-    print(f'source-checksum {source_checksum:x}')
-    target_checksum = int.from_bytes(reader.read(4), 'little', signed=False)
-    print(f'target-checksum {target_checksum:x}')
-    patch_checksum = int.from_bytes(patch.read(4), 'little', signed=False)
-    print(f'patch-checksum  {patch_checksum:x}')
+    reader = _RingReader(_NoCrcReadState(patch), patch_size - 4) # Nothing gets checked
+    read = reader.read
+    decode_number = _decode_number
+    parts: List[str] = []
+    write = parts.append # The listing is written out in one go, once reading stops
+
+    try:
+        write(f'string          {read(4)}\n')
+        source_size = decode_number(reader)
+        write(f'source-size     {source_size}\n')
+        target_size = decode_number(reader)
+        write(f'target-size     {target_size}\n')
+        metadata_size = decode_number(reader)
+        write(f'metadata-size   {metadata_size}\n')
+        metadata = read(metadata_size)
+        write(f'metadata        {metadata}\n')
+
+        patch_end = patch_size - 12
+        write('repeat\n')
+        while reader.position < patch_end:
+            data = decode_number(reader)
+            command = data & 3
+            length = (data >> 2) + 1
+            if command == 0:
+                write(f'   SourceRead {length}\n')
+            elif command == 1:
+                write(f'   TargetRead {length} {read(length)}\n')
+            elif command == 2:
+                data = decode_number(reader)
+                write(f'   SourceCopy {length} {-(data >> 1) if (data & 1) else (data >> 1)}\n')
+            elif command == 3:
+                data = decode_number(reader)
+                write(f'   TargetCopy {length} {-(data >> 1) if (data & 1) else (data >> 1)}\n')
+            else:
+                raise InvalidFormatError(f'Invalid command {command} (expected 0, 1, 2, or 3)')
+
+        source_checksum = int.from_bytes(read(4), 'little', signed=False)
+        write(f'source-checksum {source_checksum:x}\n')
+        target_checksum = int.from_bytes(read(4), 'little', signed=False)
+        write(f'target-checksum {target_checksum:x}\n')
+        patch_checksum = int.from_bytes(patch.read(4), 'little', signed=False)
+        write(f'patch-checksum  {patch_checksum:x}\n')
+    finally:
+        # Whatever was read still gets listed, which matters most when the patch is malformed
+        (sys.stdout if file is None else file).write(''.join(parts))
 
 
 def _patch(
@@ -134,72 +539,123 @@ def _patch(
         patch: BinaryIO,
         patch_size: int,
         target_abs: BinaryIO,
-        target_rel: BinaryIO,
-        skip_checksum: bool = False
+        skip_checksum: bool = False,
+        verbose: bool = False
     ) -> PatchResult:
     """Returns the metadata string (may be empty)"""
-    state = _PatchState(source_abs, patch, target_abs)
+    state = _PatchState(source_abs, patch, target_abs, skip_checksum)
+    reader = _RingReader(state.patch, patch_size - 4)
 
-    if (magic := state.patch.read(4)) != MAGIC:
+    if (magic := bytes(reader.read(4))) != MAGIC:
         raise InvalidFormatError(f'File magic {magic} != {MAGIC}')
-    source_size = _decode_number(state.patch)
-    target_size = _decode_number(state.patch)
-    metadata_size = _decode_number(state.patch)
-    metadata = state.patch.read(metadata_size)
-
-    target_rel_base = target_rel.tell()
-
-    patch_end = patch_size - 12
-    while state.patch.position < patch_end:
-        data = _decode_number(state.patch)
-        command = data & 3
-        length = (data >> 2) + 1
-        if command == 0:
-            _buffered_copy(state.source, state.target, length)
-        elif command == 1:
-            _buffered_copy(state.patch, state.target, length)
-        elif command == 2:
-            data = _decode_number(state.patch)
-            source_rel.seek((-1 if (data & 1) else 1) * (data >> 1), io.SEEK_CUR)
-            _buffered_copy(source_rel, state.target, length)
-        elif command == 3:
-            data = _decode_number(state.patch)
-            target_rel.seek((-1 if (data & 1) else 1) * (data >> 1), io.SEEK_CUR)
-            # target_rel_offset = target_rel.tell() - target_rel_base
-            # Data can be buffered, instead of copied byte by byte
-            # if state.target.position - 8 > target_rel_offset:
-            #     while length > 0:
-            #         state.target.buffer.flush()
-            #         buffer = target_rel.read(min(length, _BUFFER_SIZE))
-            #         state.target.write(buffer)
-            #         length -= _BUFFER_SIZE
-            # else:
-            for _ in range(length):
-                state.target.buffer.flush()
-                state.target.write(target_rel.read(1))
-        else:
-            raise InvalidFormatError(f'Invalid command {command} (expected 0, 1, 2, or 3)')
-        print(state.target.position)
+    source_size = _decode_number(reader)
+    target_size = _decode_number(reader)
+    metadata_size = _decode_number(reader)
+    metadata = bytes(reader.read(metadata_size))
+
+    source_rel_mapped = _map_file(source_rel, prefetch=True)
+    source_rel_reader: _Readable = source_rel if source_rel_mapped is None else _MmapReader(source_rel_mapped, checksum=False)
+
+    # Parse the whole command stream up front into flat arrays, so that executing it is just a
+    # straight run of copies. TargetRead data is left in the patch and sliced out when needed.
+    reader.refill(patch_size - 4 - reader.position)
+    body = memoryview(reader.buffer)
+    commands = array('B')
+    lengths = array('q')
+    args = array('q') # Patch offset for TargetRead, source/target offset for SourceCopy/TargetCopy
+    decode_varint = _decode_varint
+    buffer = reader.buffer
+    index = reader.index
+    end = patch_size - 12 - (reader.position - index)
+    source_rel_offset = 0
+    target_rel_offset = 0
+    try:
+        while index < end:
+            data, index = decode_varint(buffer, index)
+            command = data & 3
+            length = (data >> 2) + 1
+            if command == 0:
+                arg = 0
+            elif command == 1:
+                arg = index
+                index += length
+            elif command == 2:
+                data, index = decode_varint(buffer, index)
+                source_rel_offset += -(data >> 1) if (data & 1) else (data >> 1)
+                arg = source_rel_offset
+                source_rel_offset += length
+            else:
+                data, index = decode_varint(buffer, index)
+                target_rel_offset += -(data >> 1) if (data & 1) else (data >> 1)
+                arg = target_rel_offset
+                target_rel_offset += length
+            commands.append(command)
+            lengths.append(length)
+            args.append(arg)
+    except IndexError:
+        raise InvalidFormatError('Unexpected end of patch') from None
+    reader.index = index
+    # Only what the commands write is held in memory; any zeros past that are left to pad()
+    state.target.reserve(min(sum(lengths), target_size))
+
+    # Bind everything the commands need to locals once
+    source = state.source
+    target = state.target
+    target_write = target.write
+    target_copy_from = target.copy
+    source_rel_seek = source_rel_reader.seek
+    # Mapped sources can be copied from in one go
+    if isinstance(source, _MmapReader):
+        def source_read(length: int, arg: int) -> None:
+            _view_copy(source, target, length)
+    else:
+        def source_read(length: int, arg: int) -> None:
+            _buffered_copy(source, target, length)
+
+    if isinstance(source_rel_reader, _MmapReader):
+        def source_copy(length: int, arg: int) -> None:
+            source_rel_seek(arg)
+            _view_copy(source_rel_reader, target, length)
+    else:
+        def source_copy(length: int, arg: int) -> None:
+            source_rel_seek(arg)
+            _buffered_copy(source_rel_reader, target, length)
+
+    def target_read(length: int, arg: int) -> None:
+        target_write(body[arg:arg + length])
+
+    def target_copy(length: int, arg: int) -> None:
+        target_copy_from(arg, length)
+
+    dispatch = (source_read, target_read, source_copy, target_copy)
+    if verbose:
+        for i, (command, length, arg) in enumerate(zip(commands, lengths, args)):
+            dispatch[command](length, arg)
+            if not i & _PROGRESS_MASK:
+                print(target.position)
+    else:
+        for command, length, arg in zip(commands, lengths, args):
+            dispatch[command](length, arg)
 
     # Make sure we calculate the full checksums!
-    while state.source.position < source_size:
+    state.source.flush()
+    if not skip_checksum and state.source.position < source_size:
         remaining = source_size - state.source.position
-        while remaining > 0:
-            state.source.read(min(remaining, _BUFFER_SIZE)) # Don't read past end
-            remaining -= _BUFFER_SIZE
-    while state.target.position < target_size:
-        remaining = target_size - state.target.position
-        while remaining > 0:
-            state.target.write(_EMPTY_DATA[:min(remaining, _BUFFER_SIZE)])
-            remaining -= _BUFFER_SIZE
-
-    source_checksum = int.from_bytes(state.patch.read(4), 'little', signed=False)
+        state.source.combine(_parallel_crc32(source_abs, state.source.position, remaining), remaining)
+    state.target.flush()
+    state.target.pad(target_size)
+
+    # zlib.crc32 returns unsigned 32-bit ints, so these compare directly against the stored checksums
+    footer = bytes(reader.read(8))
+    state.patch.flush()
+    footer += state.patch.read(4)
+    if len(footer) != 12:
+        raise InvalidFormatError('Unexpected end of patch')
+    source_checksum, target_checksum, patch_checksum = _FOOTER.unpack(footer)
     if not skip_checksum and state.source.checksum != source_checksum:
         raise ChecksumFailure(f'Source checksum {state.source.checksum:x} != {source_checksum:x}')
-    target_checksum = int.from_bytes(state.patch.read(4), 'little', signed=False)
     if not skip_checksum and state.target.checksum != target_checksum:
         raise ChecksumFailure(f'Source checksum {state.target.checksum:x} != {target_checksum:x}')
-    patch_checksum = int.from_bytes(patch.read(4), 'little', signed=False)
     if not skip_checksum and state.patch.checksum != patch_checksum:
         raise ChecksumFailure(f'Source checksum {state.patch.checksum:x} != {patch_checksum:x}')
 
@@ -222,7 +678,8 @@ def patch(
         patch: _File,
         target: _File,
         patch_size: Optional[int] = None,
-        skip_checksum: bool = False
+        skip_checksum: bool = False,
+        verbose: bool = False
     ) -> PatchResult:
     if isinstance(source, _MustBeOpened):
         source_abs = open(source, 'rb')
@@ -240,7 +697,6 @@ def patch(
 
     if isinstance(target, _MustBeOpened):
         target_abs = open(target, 'wb')
-        target_rel = open(target, 'rb')
     else:
         raise ValueError('target must be file path')
 
@@ -250,8 +706,8 @@ def patch(
         patch,
         patch_size,
         target_abs,
-        target_rel,
-        skip_checksum
+        skip_checksum,
+        verbose
     )
 
 
@@ -273,7 +729,6 @@ if __name__ == '__main__':
         'result.z64'
     )
     exit()
-    import sys
     if len(sys.argv) < 2 or sys.argv[1] not in ('patch', 'dis'):
         print('Usage: pybps.py <patch|dis> ...')
         exit(1)